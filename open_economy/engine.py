@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Iterator
 
 from .model import Constraint, EconomicAct, ModelSpec, Rule
 from .record import ExecutionRecord, ExecutionRecordEntry
@@ -55,13 +55,21 @@ class ExecutionEngine:
         rule_map: dict[str, tuple[str, tuple[str, ...]]],
     ) -> ExecutionRecord:
         record = ExecutionRecord()
+        record.entries.extend(self.iter_run(acts, state, rule_map))
+        return record
+
+    def iter_run(
+        self,
+        acts: tuple[EconomicAct, ...],
+        state: dict[str, Any],
+        rule_map: dict[str, tuple[str, tuple[str, ...]]],
+    ) -> Iterator[ExecutionRecordEntry]:
         current_state = dict(state)
         for act in acts:
             rule_id, constraints = rule_map[act.act_id]
             entry = self.apply_rule(act, current_state, rule_id, constraints)
-            record.entries.append(entry)
+            yield entry
             current_state = dict(entry.state_after)
-        return record
 
     def _require_rule(self, rule_id: str) -> Rule:
         if rule_id not in self.spec.rules:
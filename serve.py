@@ -0,0 +1,667 @@
+"""Local HTTP service that streams cached simulation and execution runs.
+
+Identical requests are keyed by a content hash of their inputs, so a run is
+computed once and shared by every client that asks for it, whether it is still
+in flight or already finished. Results are streamed back as newline-delimited
+JSON in chunks so long horizons can be drawn progressively.
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import hashlib
+import json
+import math
+import operator
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Iterator
+from urllib.parse import parse_qs, urlsplit
+
+from open_economy import (
+    Constraint,
+    EconomicAct,
+    ExecutionEngine,
+    ModelSpec,
+    Parameter,
+    ReasoningView,
+    Rule,
+    TradeOff,
+    ValueMetric,
+)
+from open_economy.record import ExecutionRecord
+from simulate import STEP_QUANTITIES, Params, State, iter_simulate
+
+MAX_HORIZON = 100_000
+MAX_BODY_BYTES = 1024 * 1024
+
+Publish = Callable[[dict[str, Any]], None]
+Producer = Callable[[Publish], dict[str, Any]]
+
+
+class FormulaError(ValueError):
+    pass
+
+
+class RequestError(ValueError):
+    pass
+
+
+# Formulas use the web app's vocabulary (`^`, min, max, log, exp, abs) plus
+# comparisons for constraints, but Python precedence and float arithmetic:
+# unary minus binds looser than `^` (`-Kp ^ 2` is -(Kp^2)), and a domain error
+# or overflow (log(0), a negative base with a fractional exponent) fails the run
+# instead of producing NaN or Infinity.
+MAX_FORMULA_LENGTH = 500
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: math.pow,
+}
+_UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+    ast.Not: operator.not_,
+}
+_CONDITION_NODES = (ast.Compare, ast.BoolOp)
+_COMPARE_OPERATORS = {
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+_FUNCTIONS = {
+    "min": min,
+    "max": max,
+    "log": math.log,
+    "exp": math.exp,
+    "abs": abs,
+}
+
+
+@dataclass(frozen=True)
+class Formula:
+    text: str
+    tree: ast.Expression
+    variables: frozenset[str]
+
+    def __call__(self, env: dict[str, Any]) -> Any:
+        return _evaluate(self.tree.body, env)
+
+    @property
+    def canonical(self) -> str:
+        return ast.dump(self.tree)
+
+
+def compile_formula(text: str, allow_conditions: bool = True) -> Formula:
+    if not isinstance(text, str):
+        raise FormulaError(f"Formula must be a string: {text!r}")
+    if len(text) > MAX_FORMULA_LENGTH:
+        raise FormulaError(f"Formula longer than {MAX_FORMULA_LENGTH} characters")
+    variables: set[str] = set()
+    try:
+        tree = ast.parse(text.replace("^", "**"), mode="eval")
+        _check(tree.body, text, variables, allow_conditions)
+    except SyntaxError as exc:
+        raise FormulaError(f"Invalid formula {text!r}: {exc.msg}") from None
+    except RecursionError:
+        raise FormulaError(f"Formula nested too deeply: {text[:40]!r}...") from None
+    return Formula(text=text, tree=tree, variables=frozenset(variables))
+
+
+def _check(
+    node: ast.AST, text: str, variables: set[str], allow_conditions: bool
+) -> None:
+    if not allow_conditions and (
+        isinstance(node, _CONDITION_NODES)
+        or (isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not))
+    ):
+        raise FormulaError(f"Conditions are not allowed in {text!r}")
+    if isinstance(node, ast.Constant):
+        if type(node.value) not in (int, float):
+            raise FormulaError(f"Unsupported constant in {text!r}: {node.value!r}")
+    elif isinstance(node, ast.Name):
+        variables.add(node.id)
+    elif isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        _check(node.left, text, variables, allow_conditions)
+        _check(node.right, text, variables, allow_conditions)
+    elif isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+        _check(node.operand, text, variables, allow_conditions)
+    elif isinstance(node, ast.Compare) and all(
+        type(op) in _COMPARE_OPERATORS for op in node.ops
+    ):
+        for child in (node.left, *node.comparators):
+            _check(child, text, variables, allow_conditions)
+    elif isinstance(node, ast.BoolOp):
+        for child in node.values:
+            _check(child, text, variables, allow_conditions)
+    elif (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in _FUNCTIONS
+        and not node.keywords
+    ):
+        for child in node.args:
+            _check(child, text, variables, allow_conditions)
+    else:
+        raise FormulaError(f"Unsupported expression in {text!r}: {ast.unparse(node)}")
+
+
+def _evaluate(node: ast.AST, env: dict[str, Any]) -> Any:
+    if isinstance(node, ast.Constant):
+        return float(node.value)
+    if isinstance(node, ast.Name):
+        if node.id not in env:
+            raise FormulaError(f"Unknown variable: {node.id}")
+        return env[node.id]
+    if isinstance(node, ast.BinOp):
+        operation = _BINARY_OPERATORS[type(node.op)]
+        return operation(_evaluate(node.left, env), _evaluate(node.right, env))
+    if isinstance(node, ast.UnaryOp):
+        return _UNARY_OPERATORS[type(node.op)](_evaluate(node.operand, env))
+    if isinstance(node, ast.Compare):
+        left = _evaluate(node.left, env)
+        for op, comparator in zip(node.ops, node.comparators):
+            right = _evaluate(comparator, env)
+            if not _COMPARE_OPERATORS[type(op)](left, right):
+                return False
+            left = right
+        return True
+    if isinstance(node, ast.BoolOp):
+        values = (_evaluate(child, env) for child in node.values)
+        return all(values) if isinstance(node.op, ast.And) else any(values)
+    if isinstance(node, ast.Call):
+        args = [_evaluate(child, env) for child in node.args]
+        return _FUNCTIONS[node.func.id](*args)
+    raise FormulaError(f"Unsupported expression: {ast.unparse(node)}")
+
+
+def content_hash(payload: dict[str, Any]) -> str:
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _encode(payload: dict[str, Any]) -> bytes:
+    return json.dumps(payload, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+
+class _Run:
+    """A computation shared by every client asking for the same inputs.
+
+    Items are stored JSON-encoded, so a value that cannot be streamed fails the
+    run as soon as it is published and each follower reuses the same bytes.
+    """
+
+    def __init__(self, key: str, notify_every: int = 50) -> None:
+        self.key = key
+        self.items: list[bytes] = []
+        self.size = 0
+        self.summary = b""
+        self.error: str | None = None
+        self.finished = False
+        self._notify_every = notify_every
+        self._condition = threading.Condition()
+
+    def publish(self, item: dict[str, Any]) -> None:
+        encoded = _encode(item)
+        with self._condition:
+            self.items.append(encoded)
+            self.size += len(encoded)
+            if len(self.items) % self._notify_every == 0:
+                self._condition.notify_all()
+
+    def finish(self, summary: bytes) -> None:
+        with self._condition:
+            self.summary = summary
+            self.size += len(summary)
+            self.finished = True
+            self._condition.notify_all()
+
+    def fail(self, message: str) -> None:
+        with self._condition:
+            self.error = message
+            self.finished = True
+            self._condition.notify_all()
+
+    def follow(self, chunk_size: int) -> Iterator[tuple[int, list[bytes]]]:
+        cursor = 0
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self.finished or len(self.items) - cursor >= chunk_size
+                )
+                batch = self.items[cursor : cursor + chunk_size]
+                finished = self.finished
+            if batch:
+                yield cursor, batch
+                cursor += len(batch)
+            elif finished:
+                return
+
+
+class RunCache:
+    """Cache of runs bounded by entry count and stored bytes.
+
+    Identical keys share one computation; only finished runs are evicted.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 128,
+        max_bytes: int = 256 * 1024 * 1024,
+        workers: int = 4,
+        notify_every: int = 50,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.notify_every = notify_every
+        self._runs: OrderedDict[str, _Run] = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="open-economy-run"
+        )
+
+    def get_or_start(self, key: str, produce: Producer) -> tuple[_Run, str]:
+        with self._lock:
+            run = self._runs.get(key)
+            if run is not None:
+                self._runs.move_to_end(key)
+                return run, "hit" if run.finished else "shared"
+            run = _Run(key, self.notify_every)
+            self._runs[key] = run
+            self._evict()
+        self._executor.submit(self._compute, run, produce)
+        return run, "miss"
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _compute(self, run: _Run, produce: Producer) -> None:
+        try:
+            summary = produce(run.publish)
+            summary_line = _encode({"done": True, "key": run.key, **summary})
+        except Exception as exc:  # reported to every follower of the run
+            with self._lock:
+                if self._runs.get(run.key) is run:
+                    del self._runs[run.key]
+            run.fail(f"{type(exc).__name__}: {exc}")
+        else:
+            run.finish(summary_line)
+            with self._lock:
+                self._evict()
+
+    def _evict(self) -> None:
+        count = len(self._runs)
+        size = sum(run.size for run in self._runs.values())
+        for key in [key for key, run in self._runs.items() if run.finished]:
+            if count <= self.max_entries and size <= self.max_bytes:
+                break
+            size -= self._runs.pop(key).size
+            count -= 1
+
+
+def simulation_request(body: dict[str, Any]) -> tuple[str, Producer]:
+    param_fields = {field.name for field in fields(Params)}
+    params_data = _mapping(body.get("params", {}), "params")
+    unknown = set(params_data) - param_fields
+    if unknown:
+        raise RequestError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+    values: dict[str, Any] = {}
+    for name, value in params_data.items():
+        if name == "T":
+            if type(value) is not int or not 0 < value <= MAX_HORIZON:
+                raise RequestError(f"T must be an integer in 1..{MAX_HORIZON}")
+            values[name] = value
+        else:
+            values[name] = _number(value, name)
+    params = Params(**values)
+
+    initial_data = _mapping(body.get("initial", {}), "initial")
+    unknown = set(initial_data) - {"Kp", "Kc"}
+    if unknown:
+        raise RequestError(f"Unknown state variables: {', '.join(sorted(unknown))}")
+    initial = State(
+        Kp=_number(initial_data.get("Kp", 1.0), "Kp"),
+        Kc=_number(initial_data.get("Kc", 0.5), "Kc"),
+    )
+
+    known = param_fields | {"Kp", "Kc"} | set(STEP_QUANTITIES)
+    formulas: dict[str, Formula] = {}
+    for name, text in _mapping(body.get("formulas", {}), "formulas").items():
+        if name not in STEP_QUANTITIES:
+            raise RequestError(f"Unknown quantity: {name}")
+        formula = compile_formula(text, allow_conditions=False)
+        missing = formula.variables - known
+        if missing:
+            raise FormulaError(f"Unknown variables in {name}: {', '.join(sorted(missing))}")
+        formulas[name] = formula
+
+    key = content_hash(
+        {
+            "kind": "simulate",
+            "params": asdict(params),
+            "initial": asdict(initial),
+            "formulas": {name: formula.canonical for name, formula in formulas.items()},
+        }
+    )
+
+    def produce(publish: Publish) -> dict[str, Any]:
+        for t, period in enumerate(iter_simulate(initial, params, formulas)):
+            for name, value in period.items():
+                if type(value) is not float or not math.isfinite(value):
+                    raise ValueError(f"{name} is not a finite number at t={t}: {value!r}")
+            publish(period)
+        return {"periods": params.T}
+
+    return key, produce
+
+
+def execution_request(body: dict[str, Any]) -> tuple[str, Producer]:
+    spec_data = _mapping(body.get("spec", {}), "spec")
+    state = dict(_mapping(body.get("state", {}), "state"))
+    acts_data = body.get("acts", [])
+    if not isinstance(acts_data, list):
+        raise RequestError("acts must be a list")
+
+    spec = ModelSpec()
+    for parameter_id, data in _mapping(spec_data.get("parameters", {}), "parameters").items():
+        data = _mapping(data, parameter_id)
+        spec.parameters[parameter_id] = Parameter(
+            parameter_id=parameter_id,
+            label=data.get("label", parameter_id),
+            description=data.get("description", ""),
+            unit=data.get("unit", ""),
+        )
+    for rule_id, data in _mapping(spec_data.get("rules", {}), "rules").items():
+        data = _mapping(data, rule_id)
+        updates = {
+            target: compile_formula(text)
+            for target, text in _mapping(data.get("updates", {}), rule_id).items()
+        }
+        spec.rules[rule_id] = Rule(
+            rule_id=rule_id,
+            label=data.get("label", rule_id),
+            formula_text=data.get(
+                "formula_text",
+                "; ".join(f"{target} = {f.text}" for target, f in updates.items()),
+            ),
+            evaluator=_rule_evaluator(updates),
+            referenced_parameters=_strings(data.get("referenced_parameters", []), rule_id),
+        )
+    for constraint_id, data in _mapping(
+        spec_data.get("constraints", {}), "constraints"
+    ).items():
+        data = _mapping(data, constraint_id)
+        condition = compile_formula(data["condition"])
+        spec.constraints[constraint_id] = Constraint(
+            constraint_id=constraint_id,
+            label=data.get("label", constraint_id),
+            formula_text=data.get("formula_text", condition.text),
+            evaluator=_constraint_evaluator(condition),
+            referenced_parameters=_strings(
+                data.get("referenced_parameters", []), constraint_id
+            ),
+            reason_template=data.get("reason_template", ""),
+        )
+    for metric_id, data in _mapping(spec_data.get("metrics", {}), "metrics").items():
+        data = _mapping(data, metric_id)
+        spec.metrics[metric_id] = ValueMetric(
+            metric_id=metric_id,
+            label=data.get("label", metric_id),
+            description=data.get("description", ""),
+        )
+    for tradeoff_id, data in _mapping(spec_data.get("tradeoffs", {}), "tradeoffs").items():
+        data = _mapping(data, tradeoff_id)
+        spec.tradeoffs[tradeoff_id] = TradeOff(
+            tradeoff_id=tradeoff_id,
+            metrics=_strings(data.get("metrics", []), tradeoff_id),
+            narrative_template=data.get("narrative_template", ""),
+        )
+
+    acts: list[EconomicAct] = []
+    rule_map: dict[str, tuple[str, tuple[str, ...]]] = {}
+    for data in acts_data:
+        data = _mapping(data, "act")
+        act = EconomicAct(
+            act_id=_string(data["act_id"], "act_id"),
+            act_type=data.get("act_type", "act"),
+            description=data.get("description", ""),
+            payload=dict(_mapping(data.get("payload", {}), "payload")),
+        )
+        if act.act_id in rule_map:
+            raise RequestError(f"Duplicate act_id: {act.act_id}")
+        constraints = _strings(data.get("constraints", []), act.act_id)
+        if _string(data["rule"], "rule") not in spec.rules:
+            raise RequestError(f"Unknown rule: {data['rule']}")
+        for constraint_id in constraints:
+            if constraint_id not in spec.constraints:
+                raise RequestError(f"Unknown constraint: {constraint_id}")
+        acts.append(act)
+        rule_map[act.act_id] = (data["rule"], constraints)
+
+    key = content_hash(
+        {"kind": "execute", "spec": spec_data, "state": state, "acts": acts_data}
+    )
+
+    def produce(publish: Publish) -> dict[str, Any]:
+        engine = ExecutionEngine(spec)
+        record = ExecutionRecord()
+        for entry in engine.iter_run(tuple(acts), state, rule_map):
+            record.entries.append(entry)
+            publish(asdict(entry))
+        return {
+            "entries": len(record.entries),
+            "reasoning": ReasoningView(record, spec).as_dict(),
+        }
+
+    return key, produce
+
+
+def _rule_evaluator(
+    updates: dict[str, Formula]
+) -> Callable[[dict[str, Any]], dict[str, Any]]:
+    def evaluate(ctx: dict[str, Any]) -> dict[str, Any]:
+        env = {**ctx["state"], **ctx["act"]}
+        return {target: formula(env) for target, formula in updates.items()}
+
+    return evaluate
+
+
+def _constraint_evaluator(condition: Formula) -> Callable[[dict[str, Any]], bool]:
+    def evaluate(ctx: dict[str, Any]) -> bool:
+        return bool(condition({**ctx["state"], **ctx["act"]}))
+
+    return evaluate
+
+
+def _mapping(value: Any, name: str) -> dict[str, Any]:
+    if not isinstance(value, dict):
+        raise RequestError(f"{name} must be an object")
+    return value
+
+
+def _string(value: Any, name: str) -> str:
+    if not isinstance(value, str):
+        raise RequestError(f"{name} must be a string")
+    return value
+
+
+def _strings(value: Any, name: str) -> tuple[str, ...]:
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise RequestError(f"{name} must be a list of strings")
+    return tuple(value)
+
+
+def _number(value: Any, name: str) -> float:
+    if type(value) not in (int, float):
+        raise RequestError(f"{name} must be a number")
+    try:
+        number = float(value)
+    except OverflowError:
+        raise RequestError(f"{name} is too large") from None
+    if not math.isfinite(number):
+        raise RequestError(f"{name} must be finite")
+    return number
+
+
+def _reject_constant(name: str) -> float:
+    raise RequestError(f"Non-finite number in request: {name}")
+
+
+ROUTES: dict[str, tuple[Callable[[dict[str, Any]], tuple[str, Producer]], str]] = {
+    "/simulate": (simulation_request, "periods"),
+    "/execute": (execution_request, "entries"),
+}
+
+
+class SimulationServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        cache: RunCache | None = None,
+        chunk_size: int = 50,
+        verbose: bool = True,
+    ) -> None:
+        super().__init__(address, SimulationHandler)
+        self.cache = cache or RunCache()
+        self.chunk_size = chunk_size
+        self.verbose = verbose
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.cache.shutdown()
+
+
+class SimulationHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = 30
+    server: SimulationServer
+
+    def do_OPTIONS(self) -> None:
+        self.send_response(204)
+        self._send_cors_headers()
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self) -> None:
+        # Drain the body before any early return so keep-alive stays in sync.
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length < 0:
+                raise ValueError(length)
+        except ValueError:
+            self.close_connection = True
+            self._send_json(400, {"error": "Invalid Content-Length"})
+            return
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            self._send_json(413, {"error": f"Body larger than {MAX_BODY_BYTES} bytes"})
+            return
+        try:
+            raw_body = self.rfile.read(length)
+        except TimeoutError:
+            self.close_connection = True
+            return
+        url = urlsplit(self.path)
+        if url.path not in ROUTES:
+            self._send_json(404, {"error": f"Unknown endpoint: {url.path}"})
+            return
+        build, item_name = ROUTES[url.path]
+        try:
+            chunk_size = int(parse_qs(url.query).get("chunk", [self.server.chunk_size])[0])
+            body = json.loads(raw_body or b"{}", parse_constant=_reject_constant)
+            key, produce = build(_mapping(body, "body"))
+        except KeyError as exc:
+            self._send_json(400, {"error": f"Missing field: {exc}"})
+            return
+        except RecursionError:
+            self._send_json(400, {"error": "Request nested too deeply"})
+            return
+        except ValueError as exc:
+            self._send_json(400, {"error": str(exc)})
+            return
+
+        run, cache_status = self.server.cache.get_or_start(key, produce)
+        self.send_response(200)
+        self._send_cors_headers()
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("X-Result-Key", key)
+        self.send_header("X-Cache", cache_status)
+        self.end_headers()
+        try:
+            for start, batch in run.follow(max(chunk_size, 1)):
+                prefix = f'{{"start":{start},"{item_name}":['.encode("utf-8")
+                self._write_chunk(prefix + b",".join(batch) + b"]}\n")
+            if run.error is not None:
+                self._write_chunk(_encode({"error": run.error}) + b"\n")
+            else:
+                self._write_chunk(run.summary + b"\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            self.close_connection = True
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+    def _send_json(self, status: int, payload: dict[str, Any]) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self._send_cors_headers()
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_cors_headers(self) -> None:
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Methods", "POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header("Access-Control-Expose-Headers", "X-Result-Key, X-Cache")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--chunk-size", type=int, default=50)
+    parser.add_argument("--cache-size", type=int, default=128)
+    parser.add_argument("--cache-mb", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    server = SimulationServer(
+        (args.host, args.port),
+        cache=RunCache(
+            max_entries=args.cache_size,
+            max_bytes=args.cache_mb * 1024 * 1024,
+            workers=args.workers,
+        ),
+        chunk_size=args.chunk_size,
+    )
+    print(f"Serving on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
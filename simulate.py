@@ -3,6 +3,11 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from typing import Callable, Iterator, Mapping
+
+# Optional per-quantity overrides: each callable receives the parameters, the
+# current stocks and every quantity computed so far in the period.
+Formulas = Mapping[str, Callable[[dict], float]]
 
 
 @dataclass
@@ -26,8 +31,10 @@ class State:
     Kc: float
 
 
-def step(state: State, params: Params) -> dict:
+def step(state: State, params: Params, formulas: Formulas | None = None) -> dict:
     """Solve one-period equilibrium and update knowledge stocks."""
+    if formulas:
+        return _step_with_formulas(state, params, formulas, dict(vars(params)))
     Kp = max(state.Kp, 1e-6)
     Kc = max(state.Kc, 1e-6)
 
@@ -80,14 +87,93 @@ def step(state: State, params: Params) -> dict:
     }
 
 
-def simulate(initial: State, params: Params) -> list[dict]:
+# The equations of step(), in evaluation order, for runs with overrides. Kept
+# apart so the default path pays nothing for the lookup.
+_EQUATIONS: tuple[tuple[str, Callable[[dict], float]], ...] = (
+    ("Ap", lambda e: e["Kp"] ** e["phi"]),
+    ("Ac", lambda e: (e["Kc"] + e["lam"] * e["Kp"]) ** e["phi"]),
+    ("licensing_income", lambda e: e["rho"] * e["lam"] * e["Kp"]),
+    ("r_and_d", lambda e: e["s_R"] * e["licensing_income"]),
+    ("owner_income", lambda e: (1 - e["s_R"]) * e["licensing_income"]),
+    ("worker_income", lambda e: (e["licensing_income"] * (1 - e["s_R"])) / e["s_R"]),
+    ("wage", lambda e: e["worker_income"] / e["Lbar"]),
+    (
+        "spend_p",
+        lambda e: e["theta_w"] * e["worker_income"] + e["theta_o"] * e["owner_income"],
+    ),
+    (
+        "spend_c",
+        lambda e: (1 - e["theta_w"]) * e["worker_income"]
+        + (1 - e["theta_o"]) * e["owner_income"],
+    ),
+    ("labor_p", lambda e: e["spend_p"] / e["wage"]),
+    ("labor_c", lambda e: e["spend_c"] / e["wage"]),
+    ("price_p", lambda e: e["wage"] / e["Ap"]),
+    ("price_c", lambda e: e["wage"] / e["Ac"]),
+    ("output_p", lambda e: e["Ap"] * e["labor_p"]),
+    ("output_c", lambda e: e["Ac"] * e["labor_c"]),
+    ("Kp_next", lambda e: (1 - e["delta"]) * e["Kp"] + e["eta"] * e["r_and_d"]),
+    (
+        "Kc_next",
+        lambda e: (1 - e["delta"]) * e["Kc"] + e["chi"] * e["output_c"] + e["lam"] * e["Kp"],
+    ),
+)
+
+STEP_QUANTITIES = tuple(name for name, _ in _EQUATIONS)
+
+_OUTPUTS = (
+    "Kp",
+    "Kc",
+    "Ap",
+    "Ac",
+    "wage",
+    "price_p",
+    "price_c",
+    "labor_p",
+    "labor_c",
+    "output_p",
+    "output_c",
+    "licensing_income",
+    "owner_income",
+    "r_and_d",
+    "Kp_next",
+    "Kc_next",
+)
+
+
+def _step_with_formulas(
+    state: State, params: Params, formulas: Formulas, params_env: dict
+) -> dict:
+    if params.s_R <= 0:
+        raise ValueError("s_R must be positive to pin down wages in this toy model.")
+    env = dict(params_env)
+    env["Kp"] = max(state.Kp, 1e-6)
+    env["Kc"] = max(state.Kc, 1e-6)
+    for name, equation in _EQUATIONS:
+        formula = formulas.get(name)
+        env[name] = formula(env) if formula is not None else equation(env)
+    return {name: env[name] for name in _OUTPUTS}
+
+
+def iter_simulate(
+    initial: State, params: Params, formulas: Formulas | None = None
+) -> Iterator[dict]:
+    """Yield one period at a time so long horizons can be consumed progressively."""
+    params_env = dict(vars(params))
     state = initial
-    history = []
     for _ in range(params.T):
-        result = step(state, params)
-        history.append(result)
+        if formulas:
+            result = _step_with_formulas(state, params, formulas, params_env)
+        else:
+            result = step(state, params)
+        yield result
         state = State(Kp=result["Kp_next"], Kc=result["Kc_next"])
-    return history
+
+
+def simulate(
+    initial: State, params: Params, formulas: Formulas | None = None
+) -> list[dict]:
+    return list(iter_simulate(initial, params, formulas))
 
 
 if __name__ == "__main__":
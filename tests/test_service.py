@@ -0,0 +1,246 @@
+import http.client
+import json
+import threading
+import unittest
+
+from serve import (
+    MAX_BODY_BYTES,
+    FormulaError,
+    RunCache,
+    SimulationServer,
+    compile_formula,
+    simulation_request,
+)
+from simulate import Params, State, simulate
+
+
+class FormulaTests(unittest.TestCase):
+    def test_caret_is_exponent(self) -> None:
+        formula = compile_formula("2 * Kp ^ phi")
+        self.assertAlmostEqual(formula({"Kp": 4.0, "phi": 0.5}), 4.0)
+        self.assertEqual(formula.variables, frozenset({"Kp", "phi"}))
+
+    def test_rejects_unsafe_expressions(self) -> None:
+        for text in ("__import__('os')", "Kp.real", "[Kp]", "open('x')"):
+            with self.assertRaises(FormulaError):
+                compile_formula(text)
+
+    def test_exponent_overflow_fails_fast(self) -> None:
+        with self.assertRaises(OverflowError):
+            compile_formula("9^9^9^2")({})
+
+    def test_rejects_oversized_and_deeply_nested_formulas(self) -> None:
+        for text in ("Kp + " * 200 + "Kp", "-" * 600 + "Kp", "(" * 240 + "Kp" + ")" * 240):
+            with self.assertRaises(FormulaError):
+                compile_formula(text)
+
+    def test_simulation_overrides_reject_conditions(self) -> None:
+        for text in ("Kp > 0", "not Kp", "Kp and phi"):
+            with self.assertRaises(FormulaError):
+                simulation_request({"formulas": {"Ap": text}})
+
+    def test_cache_key_ignores_formatting(self) -> None:
+        key_a, _ = simulation_request({"params": {"T": 5}, "formulas": {"Ap": "Kp^phi"}})
+        key_b, _ = simulation_request(
+            {"params": {"T": 5, "phi": 0.6}, "formulas": {"Ap": "Kp ^ phi"}}
+        )
+        key_c, _ = simulation_request({"params": {"T": 6}, "formulas": {"Ap": "Kp^phi"}})
+        self.assertEqual(key_a, key_b)
+        self.assertNotEqual(key_a, key_c)
+
+
+class RunCacheTests(unittest.TestCase):
+    def test_concurrent_requests_share_one_computation(self) -> None:
+        cache = RunCache()
+        release = threading.Event()
+        calls = []
+
+        def produce(publish):
+            calls.append(1)
+            release.wait(5)
+            publish({"value": 1})
+            return {}
+
+        first, first_status = cache.get_or_start("key", produce)
+        second, second_status = cache.get_or_start("key", produce)
+        release.set()
+        self.assertEqual(list(second.follow(10)), [(0, [b'{"value":1}'])])
+        third, third_status = cache.get_or_start("key", produce)
+        cache.shutdown()
+        self.assertIs(first, second)
+        self.assertIs(first, third)
+        self.assertEqual((first_status, second_status, third_status), ("miss", "shared", "hit"))
+        self.assertEqual(len(calls), 1)
+
+    def test_failed_run_is_evicted(self) -> None:
+        cache = RunCache()
+
+        def produce(publish):
+            publish({"value": float("nan")})
+            return {}
+
+        run, _ = cache.get_or_start("key", produce)
+        self.assertEqual(list(run.follow(10)), [])
+        self.assertIn("ValueError", run.error)
+        retry, status = cache.get_or_start("key", produce)
+        cache.shutdown()
+        self.assertIsNot(run, retry)
+        self.assertEqual(status, "miss")
+
+    def test_evicts_finished_runs_over_byte_budget(self) -> None:
+        cache = RunCache(max_bytes=1000)
+
+        def produce(publish):
+            publish({"payload": "x" * 600})
+            return {}
+
+        first, _ = cache.get_or_start("first", produce)
+        list(first.follow(10))
+        second, _ = cache.get_or_start("second", produce)
+        list(second.follow(10))
+        _, status = cache.get_or_start("first", produce)
+        cache.shutdown()
+        self.assertEqual(status, "miss")
+
+
+class SimulationServerTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = SimulationServer(("127.0.0.1", 0), verbose=False)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def _post(self, path: str, body: dict) -> tuple[http.client.HTTPResponse, list[dict]]:
+        connection = http.client.HTTPConnection(*self.server.server_address)
+        connection.request("POST", path, json.dumps(body), {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        lines = [json.loads(line) for line in response.read().splitlines()]
+        connection.close()
+        return response, lines
+
+    def test_streams_periods_in_chunks_and_caches(self) -> None:
+        body = {"params": {"T": 120}, "initial": {"Kp": 1.0, "Kc": 0.5}}
+        response, lines = self._post("/simulate?chunk=50", body)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("X-Cache"), "miss")
+        self.assertEqual([line["start"] for line in lines[:-1]], [0, 50, 100])
+        self.assertEqual(lines[-1]["periods"], 120)
+        periods = [period for line in lines[:-1] for period in line["periods"]]
+        self.assertEqual(periods, simulate(State(Kp=1.0, Kc=0.5), Params(T=120)))
+
+        response, _ = self._post("/simulate", body)
+        self.assertEqual(response.getheader("X-Cache"), "hit")
+
+    def test_formula_override_changes_results(self) -> None:
+        _, lines = self._post(
+            "/simulate", {"params": {"T": 3}, "formulas": {"Ap": "2 * Kp ^ phi"}}
+        )
+        self.assertAlmostEqual(lines[0]["periods"][0]["Ap"], 2.0)
+
+    def test_runtime_failure_reports_error_and_is_not_cached(self) -> None:
+        body = {"params": {"T": 1}, "formulas": {"Ap": "9^9^9^2"}}
+        response, lines = self._post("/simulate", body)
+        self.assertEqual(response.status, 200)
+        self.assertIn("OverflowError", lines[-1]["error"])
+        response, _ = self._post("/simulate", body)
+        self.assertEqual(response.getheader("X-Cache"), "miss")
+
+    def test_non_finite_or_non_real_values_fail_the_run(self) -> None:
+        for body in (
+            {"params": {"T": 3000, "delta": -1.0}},
+            {"formulas": {"Ap": "(Kp - 2) ^ phi"}},
+        ):
+            response, lines = self._post("/simulate", body)
+            self.assertEqual(response.status, 200)
+            self.assertNotIn("done", lines[-1])
+            self.assertIn("error", lines[-1])
+
+    def test_rejects_unknown_parameter(self) -> None:
+        response, lines = self._post("/simulate", {"params": {"gamma": 1}})
+        self.assertEqual(response.status, 400)
+        self.assertIn("gamma", lines[0]["error"])
+
+    def test_rejects_oversized_and_non_finite_numbers(self) -> None:
+        for raw in ('{"params": {"phi": 1%s}}' % ("0" * 400), '{"initial": {"Kp": 1e400}}'):
+            connection = http.client.HTTPConnection(*self.server.server_address)
+            connection.request("POST", "/simulate", raw)
+            response = connection.getresponse()
+            error = json.loads(response.read())["error"]
+            connection.close()
+            self.assertEqual(response.status, 400)
+            self.assertRegex(error, "too large|must be finite")
+
+    def test_rejects_unsafe_formula(self) -> None:
+        response, lines = self._post("/simulate", {"formulas": {"Ap": "__import__('os')"}})
+        self.assertEqual(response.status, 400)
+        self.assertIn("Unsupported expression", lines[0]["error"])
+
+    def test_rejects_malformed_spec_entries(self) -> None:
+        response, lines = self._post("/execute", {"spec": {"rules": {"r": "oops"}}})
+        self.assertEqual(response.status, 400)
+        self.assertEqual(lines[0]["error"], "r must be an object")
+
+    def test_rejects_duplicate_act_ids(self) -> None:
+        rule = {"updates": {"x": "1"}}
+        body = {
+            "spec": {"rules": {"a": rule, "b": rule}},
+            "acts": [{"act_id": "same", "rule": "a"}, {"act_id": "same", "rule": "b"}],
+        }
+        response, lines = self._post("/execute", body)
+        self.assertEqual(response.status, 400)
+        self.assertEqual(lines[0]["error"], "Duplicate act_id: same")
+
+    def test_rejects_oversized_body(self) -> None:
+        connection = http.client.HTTPConnection(*self.server.server_address)
+        connection.putrequest("POST", "/simulate")
+        connection.putheader("Content-Length", str(MAX_BODY_BYTES + 1))
+        connection.endheaders()
+        response = connection.getresponse()
+        response.read()
+        connection.close()
+        self.assertEqual(response.status, 413)
+
+    def test_unknown_endpoint_keeps_connection_usable(self) -> None:
+        connection = http.client.HTTPConnection(*self.server.server_address)
+        connection.request("POST", "/nope", json.dumps({"params": {"T": 2}}))
+        response = connection.getresponse()
+        response.read()
+        self.assertEqual(response.status, 404)
+        connection.request("POST", "/simulate", json.dumps({"params": {"T": 2}}))
+        response = connection.getresponse()
+        lines = [json.loads(line) for line in response.read().splitlines()]
+        connection.close()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(lines[-1]["periods"], 2)
+
+    def test_execute_streams_entries_and_reasoning(self) -> None:
+        body = {
+            "spec": {
+                "rules": {
+                    "compute_profit": {
+                        "label": "Compute Profit",
+                        "updates": {"profit": "revenue - cost"},
+                    }
+                },
+                "constraints": {
+                    "budget_guard": {"label": "Budget Guard", "condition": "revenue >= cost"}
+                },
+            },
+            "state": {"revenue": 2, "cost": 6},
+            "acts": [
+                {"act_id": "act-1", "rule": "compute_profit", "constraints": ["budget_guard"]}
+            ],
+        }
+        response, lines = self._post("/execute", body)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(lines[0]["entries"][0]["status"], "blocked")
+        blocked = lines[-1]["reasoning"]["blocked_acts"]
+        self.assertEqual(blocked[0]["blocked_by"], ["Budget Guard"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+
+from serve import compile_formula
+from simulate import STEP_QUANTITIES, Params, State, simulate, step
+
+
+class OverrideEquationTests(unittest.TestCase):
+    def test_identity_override_matches_default_path(self) -> None:
+        initial = State(Kp=1.0, Kc=0.5)
+        for params in (Params(T=50), Params(T=50, lam=0.9, s_R=0.6, delta=0.1)):
+            overridden = simulate(initial, params, {"Ap": compile_formula("Kp ^ phi")})
+            self.assertEqual(overridden, simulate(initial, params))
+
+    def test_step_quantities_cover_step_outputs(self) -> None:
+        default = step(State(Kp=1.0, Kc=0.5), Params())
+        overridden = step(
+            State(Kp=1.0, Kc=0.5), Params(), {"Ap": compile_formula("Kp ^ phi")}
+        )
+        self.assertEqual(list(overridden), list(default))
+        self.assertLessEqual(set(default) - {"Kp", "Kc"}, set(STEP_QUANTITIES))
+
+
+if __name__ == "__main__":
+    unittest.main()